@@ -1,14 +1,20 @@
+import asyncio
 import os
 import re
+import string
+import time
+from collections import OrderedDict
+from functools import lru_cache
+import orjson
 from fastapi import FastAPI, HTTPException, Header
 from pydantic import BaseModel, Field
 
 import copy
-from fastapi.responses import JSONResponse
+from fastapi.responses import Response
 
-from main import load_forbidden, generate_candidates, filter_candidates, write_final
+from main import load_forbidden, prepare_forbidden, generate_candidates_async, iter_filter_candidates, write_final_async
 
-from response_budget import enforce_response_budget
+from response_budget import encode_response_budget
 
 app = FastAPI(
     title="Movie Filter API",
@@ -31,10 +37,19 @@ def require_auth(authorization: str | None):
     if token != ACTION_API_KEY:
         raise HTTPException(status_code=403, detail="Invalid API key")
 
+_TITLE_STRIP = re.compile(r"[\s\W_]+")
+
+# ASCII 제목용: 소문자/숫자 외 ASCII 문자는 전부 삭제 (regex 없이 C 레벨 translate)
+_TITLE_KEEP = set(string.ascii_lowercase + string.digits)
+_TITLE_DEL_TABLE = {i: None for i in range(128) if chr(i) not in _TITLE_KEEP}
+
+@lru_cache(maxsize=4096)
 def _norm_title(s: str) -> str:
-    s = (s or "").strip().lower()
-    s = re.sub(r"[\s\W_]+", "", s)
-    return s
+    s = (s or "").lower()
+    if s.isascii():
+        return s.translate(_TITLE_DEL_TABLE)
+    # 한글 등 비ASCII 포함 시에만 regex
+    return _TITLE_STRIP.sub("", s)
 
 def _build_forbidden_title_set(forbidden: list[dict]) -> set[str]:
     out: set[str] = set()
@@ -45,6 +60,28 @@ def _build_forbidden_title_set(forbidden: list[dict]) -> set[str]:
     out.discard("")
     return out
 
+FORBIDDEN_PATH = "forbidden.json"
+FORBIDDEN_RECHECK_SEC = 2.0
+
+_FORBIDDEN_CACHE = {"mtime": 0.0, "checked": 0.0, "data": None, "titles": None}
+
+def _get_forbidden() -> tuple[dict[str, tuple], frozenset[str]]:
+    # 파싱 결과를 모듈에 들고 있다가 mtime이 바뀔 때만 다시 읽음
+    # (stat도 FORBIDDEN_RECHECK_SEC 간격으로만 확인)
+    cache = _FORBIDDEN_CACHE
+    now = time.monotonic()
+    if cache["data"] is not None and now - cache["checked"] < FORBIDDEN_RECHECK_SEC:
+        return cache["data"], cache["titles"]
+    cache["checked"] = now
+
+    mtime = os.path.getmtime(FORBIDDEN_PATH)
+    if cache["data"] is None or mtime != cache["mtime"]:
+        forbidden = load_forbidden(FORBIDDEN_PATH)
+        cache["titles"] = frozenset(_build_forbidden_title_set(forbidden))
+        cache["data"] = prepare_forbidden(forbidden)
+        cache["mtime"] = mtime
+    return cache["data"], cache["titles"]
+
 # ✅ Actions 응답 크기 강제 제한(더 강하게)
 MAX_STYLE_HINT_CHARS = 500
 MAX_TITLE_CHARS = 80
@@ -53,78 +90,144 @@ MAX_BEHIND_CHARS = 160
 MAX_VIBE_CHARS = 120
 
 def _clip(s: str, limit: int) -> str:
-    s = (s or "").strip()
+    if not s:
+        return ""
+    # 대부분 이미 짧고 앞뒤 공백도 없음 → strip() 복사 생략
+    if len(s) <= limit and not s[0].isspace() and not s[-1].isspace():
+        return s
+    s = s.strip()
     if len(s) <= limit:
         return s
     return s[: max(0, limit - 1)] + "…"
 
+def _iter_clean_items(finals, forbidden_titles: frozenset[str], k: int):
+    # 금지(별칭 포함) + 중복 제거 + 길이 제한을 한 번에 (ResponseTooLargeError 방지)
+    seen = set()
+    count = 0
+    norm_keys = [_norm_title(x.movie) for x in finals]
+    for x, key in zip(finals, norm_keys):
+        if not key or key in forbidden_titles or key in seen:
+            continue
+        seen.add(key)
+        yield {
+            "movie": _clip(x.movie, MAX_TITLE_CHARS),
+            "scene": _clip(x.scene, MAX_SCENE_CHARS),
+            "behind": _clip(x.behind, MAX_BEHIND_CHARS),
+            "vibe_point": _clip(x.vibe_point, MAX_VIBE_CHARS),
+        }
+        count += 1
+        if count >= k:
+            return
+
 class GenerateReq(BaseModel):
     style_hint: str = Field(..., description="원하는 분위기/느낌 요약")
     k: int = Field(10, ge=1, le=10, description="최종 출력 개수 (기본 10)")
     n: int = Field(10, ge=1, le=80, description="후보 생성 개수 (입력 1~80 허용, 서버에서 최소 10으로 보정)")
 @app.get("/health")
-def health():
+def health() -> dict[str, bool]:
     return {"ok": True}
 
-@app.post("/generate")
-def generate(req: GenerateReq, authorization: str | None = Header(default=None)):
-    require_auth(authorization)
-
-    if len(req.style_hint or "") > MAX_STYLE_HINT_CHARS:
-        raise HTTPException(status_code=422, detail=f"style_hint too long (max {MAX_STYLE_HINT_CHARS} chars)")
-
-    n_eff = max(req.n, 10)
-
-    forbidden = load_forbidden("forbidden.json")
-    forbidden_titles = _build_forbidden_title_set(forbidden)
-
-    # 후보를 몇 번 돌려서 k개 채울 재료 확보(최대 4회)
+# 후보 생성(OpenAI 호출)을 한 번에 몇 개씩 동시에 보낼지
+CANDIDATE_BATCH = 2
+# 금지 필터를 통과한 후보를 최대 몇 개까지 모을지
+SAFE_POOL_CAP = 200
+
+# 같은 느낌(style_hint) + k/n 요청은 결과를 재사용 → OpenAI 호출 생략
+GENERATE_CACHE_SIZE = 256
+GENERATE_CACHE_TTL_SEC = 600.0
+
+_GENERATE_CACHE: OrderedDict[tuple, tuple[float, tuple[tuple[dict, ...], str]]] = OrderedDict()
+
+def _hint_key(style_hint: str) -> str:
+    return _TITLE_STRIP.sub("", (style_hint or "").lower())[:MAX_STYLE_HINT_CHARS]
+
+def _cache_get(key: tuple):
+    hit = _GENERATE_CACHE.get(key)
+    if hit is None:
+        return None
+    if time.monotonic() - hit[0] > GENERATE_CACHE_TTL_SEC:
+        del _GENERATE_CACHE[key]
+        return None
+    _GENERATE_CACHE.move_to_end(key)
+    return hit[1]
+
+def _cache_put(key: tuple, value) -> None:
+    _GENERATE_CACHE[key] = (time.monotonic(), value)
+    _GENERATE_CACHE.move_to_end(key)
+    while len(_GENERATE_CACHE) > GENERATE_CACHE_SIZE:
+        _GENERATE_CACHE.popitem(last=False)
+
+async def _run_pipeline(style_hint: str, k: int, n_eff: int, forbidden, forbidden_titles):
+    # 후보를 몇 번 돌려서 k개 채울 재료 확보(최대 4회, 2개씩 동시에 호출)
     safe_pool = []
     tries = 0
     while tries < 4 and len(safe_pool) < 120:
-        tries += 1
-        cands = generate_candidates(req.style_hint, n=n_eff)
-        safe_pool += filter_candidates(cands, forbidden)
-        if len(safe_pool) > 200:
-            safe_pool = safe_pool[:200]
+        batch = min(CANDIDATE_BATCH, 4 - tries)
+        tries += batch
+        results = await asyncio.gather(*(
+            generate_candidates_async(style_hint, n_eff)
+            for _ in range(batch)
+        ))
+        # 상한을 채우면 남은 후보는 금지 검사도 하지 않고 바로 멈춤
+        for cands in results:
+            for c in iter_filter_candidates(cands, forbidden):
+                safe_pool.append(c)
+                if len(safe_pool) >= SAFE_POOL_CAP:
+                    break
+            if len(safe_pool) >= SAFE_POOL_CAP:
+                break
 
     # 최종 생성
-    finals = write_final(safe_pool[:80], k=req.k)
+    finals = await write_final_async(safe_pool[:80], k)
 
-    # 금지(별칭 포함) + 중복 제거
-    seen = set()
-    cleaned = []
-    for x in finals:
-        title = getattr(x, "movie", "")
-        key = _norm_title(title)
-        if not key:
-            continue
-        if key in forbidden_titles:
-            continue
-        if key in seen:
-            continue
-        seen.add(key)
-        cleaned.append(x)
-        if len(cleaned) >= req.k:
-            break
-
-    # ✅ 응답을 짧게 잘라서 반환 (ResponseTooLargeError 방지)
     items = []
-    for x in cleaned[:req.k]:
-        items.append({
-            "movie": _clip(getattr(x, "movie", ""), MAX_TITLE_CHARS),
-            "scene": _clip(getattr(x, "scene", ""), MAX_SCENE_CHARS),
-            "behind": _clip(getattr(x, "behind", ""), MAX_BEHIND_CHARS),
-            "vibe_point": _clip(getattr(x, "vibe_point", ""), MAX_VIBE_CHARS),
-        })
-
-    # ✅ Actions 출력 고정용: 모델이 요약하지 않도록 "완성본 텍스트"도 같이 제공
     lines = []
-    for i, it in enumerate(items, start=1):
+    for i, it in enumerate(_iter_clean_items(finals, forbidden_titles, k), start=1):
+        items.append(it)
+        # ✅ Actions 출력 고정용: 모델이 요약하지 않도록 "완성본 텍스트"도 같이 제공
         lines.append(
-            f"{i}) {it.get('movie','')} | 장면: {it.get('scene','')} | 비하인드: {it.get('behind','')} | 포인트: {it.get('vibe_point','')}"
+            f"{i}) {it['movie']} | 장면: {it['scene']} | 비하인드: {it['behind']} | 포인트: {it['vibe_point']}"
         )
-    output = "\n".join(lines)
+    return tuple(items), "\n".join(lines)
+
+# 동시에 들어온 같은 요청은 파이프라인 하나를 공유 (키 → 진행 중인 Task)
+_INFLIGHT: dict[tuple, asyncio.Task] = {}
+
+async def _run_and_cache(key: tuple, *args):
+    hit = await _run_pipeline(*args)
+    if hit[0]:
+        _cache_put(key, hit)
+    return hit
+
+def _inflight_done(key: tuple, task: asyncio.Task) -> None:
+    _INFLIGHT.pop(key, None)
+    # 기다리던 요청이 모두 끊긴 경우에도 "exception was never retrieved" 경고가 나지 않도록
+    if not task.cancelled():
+        task.exception()
+
+async def _generate(req: GenerateReq) -> dict:
+    if len(req.style_hint or "") > MAX_STYLE_HINT_CHARS:
+        raise HTTPException(status_code=422, detail=f"style_hint too long (max {MAX_STYLE_HINT_CHARS} chars)")
+
+    n_eff = max(req.n, 10)
+
+    forbidden, forbidden_titles = _get_forbidden()
+
+    # forbidden.json이 바뀌면 예전 결과는 쓰지 않도록 mtime도 키에 포함
+    key = (_hint_key(req.style_hint), req.k, n_eff, _FORBIDDEN_CACHE["mtime"])
+    hit = _cache_get(key)
+    if hit is None:
+        # 같은 키로 이미 진행 중인 파이프라인이 있으면 그 결과를 같이 기다림
+        task = _INFLIGHT.get(key)
+        if task is None:
+            task = asyncio.ensure_future(
+                _run_and_cache(key, req.style_hint, req.k, n_eff, forbidden, forbidden_titles)
+            )
+            _INFLIGHT[key] = task
+            task.add_done_callback(lambda t, key=key: _inflight_done(key, t))
+        # shield: 먼저 온 클라이언트가 끊겨도 같이 기다리는 다른 요청의 작업은 취소되지 않음
+        hit = await asyncio.shield(task)
+    items, output = hit
 
     resp = {
         "ok": True,
@@ -132,12 +235,17 @@ def generate(req: GenerateReq, authorization: str | None = Header(default=None))
         "n": n_eff,
         "count": len(items),    "output": output,
 
-        "items": items,
+        "items": list(items),
     }
-
-    resp = enforce_response_budget(resp)
     return resp
 
+@app.post("/generate")
+async def generate(req: GenerateReq, authorization: str | None = Header(default=None)):
+    require_auth(authorization)
+    resp = await _generate(req)
+    # 크기 검사 때 직렬화한 bytes를 그대로 응답 → 두 번 인코딩하지 않음
+    return Response(content=encode_response_budget(resp), media_type="application/json")
+
 
 # --- Actions-friendly OpenAPI (forces 3.0.2) ---
 def _actions_openapi_spec():
@@ -161,21 +269,28 @@ def _actions_openapi_spec():
 
     return spec
 
+# 런타임에 스펙이 바뀌지 않으므로 한 번만 만들고 직렬화한 bytes를 재사용
+_SPEC_CACHE: bytes | None = None
+
 @app.get("/actions_openapi.json", include_in_schema=False)
 def actions_openapi():
-    return JSONResponse(_actions_openapi_spec())
+    global _SPEC_CACHE
+    if _SPEC_CACHE is None:
+        _SPEC_CACHE = orjson.dumps(_actions_openapi_spec())
+    return Response(content=_SPEC_CACHE, media_type="application/json")
 
 # --- Actions 전용: 모델이 요약하지 않도록 "output만" 반환 ---
 @app.post("/generate_actions")
-def generate_actions(req: GenerateReq, authorization: str | None = Header(default=None)):
+async def generate_actions(req: GenerateReq, authorization: str | None = Header(default=None)):
     # 기존 /generate 로직을 그대로 재사용
-    resp = generate(req, authorization)
+    require_auth(authorization)
+    resp = await _generate(req)
 
     out = resp.get("output", "")
     lines = out.split("\n") if out else []
 
     # Actions는 이 응답만 보고 그대로 출력하도록 유도하기 쉽다
-    return {
+    body = {
         "ok": bool(resp.get("ok", True)),
         "k": resp.get("k", req.k),
         "n": resp.get("n", getattr(req, "n", None)),
@@ -183,3 +298,16 @@ def generate_actions(req: GenerateReq, authorization: str | None = Header(defaul
         "output": out,
         "lines": lines,
     }
+    return Response(content=orjson.dumps(body), media_type="application/json")
+
+if __name__ == "__main__":
+    import uvicorn
+
+    # uvicorn[standard]에 들어있는 uvloop + httptools를 명시적으로 사용 (I/O 위주 엔드포인트)
+    uvicorn.run(
+        app,
+        host="0.0.0.0",
+        port=int(os.getenv("PORT", "8000")),
+        loop="uvloop",
+        http="httptools",
+    )
@@ -1,14 +1,21 @@
 import json
-from typing import List
+from dataclasses import asdict, dataclass
+from typing import Iterator, List
 from pydantic import BaseModel
-from openai import OpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, OpenAI, DefaultHttpxClient
 
 import copy
 from fastapi.responses import JSONResponse
 
-client = OpenAI()
+# HTTP/2: 동시에 보내는 후보 생성 호출들이 연결 하나에서 멀티플렉싱됨 (SDK 기본 타임아웃/풀 설정은 유지)
+client = OpenAI(http_client=DefaultHttpxClient(http2=True))
+# API 서버용: 요청 간에 공유하는 비동기 클라이언트 → 동시 호출이 스레드 풀 크기에 묶이지 않음
+aclient = AsyncOpenAI(http_client=DefaultAsyncHttpxClient(http2=True))
 
-class Candidate(BaseModel):
+# 후보/최종 항목은 요청마다 수십~수백 개 생성되는 내부 타입 → slots dataclass
+# (OpenAI 응답 파싱 경계인 *Batch만 pydantic 모델로 둠. pydantic이 dataclass 필드를 바로 검증/생성)
+@dataclass(slots=True)
+class Candidate:
     movie: str
     scene_keys: List[str]
     trick_keys: List[str]
@@ -17,7 +24,8 @@ class Candidate(BaseModel):
 class CandidateBatch(BaseModel):
     candidates: List[Candidate]
 
-class FinalItem(BaseModel):
+@dataclass(slots=True)
+class FinalItem:
     movie: str
     scene: str
     behind: str
@@ -30,21 +38,33 @@ def load_forbidden(path="forbidden.json"):
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
-def is_forbidden(c: Candidate, forbidden_list, scene_min=2, trick_min=1) -> bool:
-    cmovie = c.movie.strip().lower()
+def prepare_forbidden(forbidden_list):
+    # 후보마다 전체를 훑지 않도록 제목 → ((scene 집합, trick 집합), ...) 인덱스로 미리 변환
+    # 한 번 만들고 요청 간에 공유하므로 전부 불변(frozenset/tuple)
+    index = {}
     for f in forbidden_list:
-        if cmovie != f["movie"].strip().lower():
-            continue
-        scene_overlap = len(set(c.scene_keys) & set(f["scene_keys"]))
-        trick_overlap = len(set(c.trick_keys) & set(f["trick_keys"]))
-        if scene_overlap >= scene_min and trick_overlap >= trick_min:
-            return True
-    return False
+        index.setdefault(f["movie"].strip().lower(), []).append(
+            (frozenset(f["scene_keys"]), frozenset(f["trick_keys"]))
+        )
+    return {movie: tuple(entries) for movie, entries in index.items()}
+
+def is_forbidden(c: Candidate, index, scene_min=2, trick_min=1) -> bool:
+    entries = index.get(c.movie.strip().lower())
+    if not entries:
+        return False
+    cs, ct = set(c.scene_keys), set(c.trick_keys)
+    return any(
+        len(cs & fscene) >= scene_min and len(ct & ftrick) >= trick_min
+        for fscene, ftrick in entries
+    )
 
-def filter_candidates(cands: List[Candidate], forbidden_list) -> List[Candidate]:
-    return [c for c in cands if not is_forbidden(c, forbidden_list)]
+def iter_filter_candidates(cands: List[Candidate], index) -> Iterator[Candidate]:
+    return (c for c in cands if not is_forbidden(c, index))
 
-def generate_candidates(style_hint: str, n=40) -> List[Candidate]:
+def filter_candidates(cands: List[Candidate], index) -> List[Candidate]:
+    return list(iter_filter_candidates(cands, index))
+
+def _candidates_input(style_hint: str, n: int) -> list:
     system = (
         "너는 영화 제작 비하인드 기반 소재 발굴가다. "
         "입력된 '느낌'과 비슷한 결의 새로운 영화 장면+제작 트릭 조합 후보를 뽑아라. "
@@ -60,32 +80,53 @@ def generate_candidates(style_hint: str, n=40) -> List[Candidate]:
 - 가능한 한 서로 다른 영화 중심
 - 각 후보는 movie, scene_keys, trick_keys, one_line_pitch 포함
 """
+    return [{"role": "system", "content": system},
+            {"role": "user", "content": user}]
+
+def generate_candidates(style_hint: str, n=40) -> List[Candidate]:
     resp = client.responses.parse(
         model="gpt-4o-mini",
-        input=[{"role": "system", "content": system},
-               {"role": "user", "content": user}],
+        input=_candidates_input(style_hint, n),
         text_format=CandidateBatch
     )
     return resp.output_parsed.candidates
 
-def write_final(cands: List[Candidate], k=6) -> List[FinalItem]:
+async def generate_candidates_async(style_hint: str, n=40) -> List[Candidate]:
+    resp = await aclient.responses.parse(
+        model="gpt-4o-mini",
+        input=_candidates_input(style_hint, n),
+        text_format=CandidateBatch
+    )
+    return resp.output_parsed.candidates
+
+def _final_input(cands: List[Candidate], k: int) -> list:
     picked = cands[:k]
     system = (
         "너는 영화 장면/비하인드를 짧고 선명한 한국어로 소개하는 작가다. "
         "주어진 후보를 사람이 읽기 좋게 정리하라. 과장 없이 명확하게."
     )
-    payload = {"candidates": [c.model_dump() for c in picked], "count": k}
+    payload = {"candidates": [asdict(c) for c in picked], "count": k}
+    return [{"role": "system", "content": system},
+            {"role": "user", "content": json.dumps(payload, ensure_ascii=False)}]
 
+def write_final(cands: List[Candidate], k=6) -> List[FinalItem]:
     resp = client.responses.parse(
         model="gpt-4o-mini",
-        input=[{"role": "system", "content": system},
-               {"role": "user", "content": json.dumps(payload, ensure_ascii=False)}],
+        input=_final_input(cands, k),
+        text_format=FinalBatch
+    )
+    return resp.output_parsed.items
+
+async def write_final_async(cands: List[Candidate], k=6) -> List[FinalItem]:
+    resp = await aclient.responses.parse(
+        model="gpt-4o-mini",
+        input=_final_input(cands, k),
         text_format=FinalBatch
     )
     return resp.output_parsed.items
 
 def main():
-    forbidden = load_forbidden("forbidden.json")
+    forbidden = prepare_forbidden(load_forbidden("forbidden.json"))
 
     style_hint = (
         "충격적인 장면이 있고, "
@@ -1,5 +1,5 @@
-import json
-from typing import Any, Dict, List
+import orjson
+from typing import Any, Dict, List, Tuple
 
 # Actions 제한(요청/응답 각각 100,000 chars 미만) 대비 여유를 둠
 MAX_RESPONSE_CHARS = 90_000
@@ -27,11 +27,18 @@ def _clip_text(v: Any, limit: int) -> Any:
         return s
     return s[: max(0, limit - 1)] + "…"
 
+KEEP_KEYS = ["movie", "title", "year", "scene", "behind", "vibe_point", "reason", "why", "notes", "aliases"]
+
+# 초미니 / 초초미니 모드에서 남기는 키와 글자 제한 (_compact_item 결과에 적용하므로 FIELD_LIMITS 이하)
+MINI_LIMITS = {"movie": 80, "year": FIELD_LIMITS["year"], "vibe_point": 120, "reason": 120}
+ULTRA_LIMITS = {"movie": 70, "year": FIELD_LIMITS["year"], "vibe_point": 60, "reason": 60}
+
+NOISY_KEYS = ["debug", "raw", "candidates", "forbidden_hits", "logs"]
+
 def _compact_item(item: Dict[str, Any]) -> Dict[str, Any]:
-    keep_keys = ["movie", "title", "year", "scene", "behind", "vibe_point", "reason", "why", "notes", "aliases"]
     out: Dict[str, Any] = {}
 
-    for k in keep_keys:
+    for k in KEEP_KEYS:
         if k in item:
             lim = FIELD_LIMITS.get(k, 160)
             out[k] = _clip_text(item.get(k), lim)
@@ -50,45 +57,89 @@ def _compact_item(item: Dict[str, Any]) -> Dict[str, Any]:
     # None/빈값 제거
     return {k: v for k, v in out.items() if v is not None and v != ""}
 
-def _json_len(obj: Any) -> int:
-    return len(json.dumps(obj, ensure_ascii=False, separators=(",", ":")))
+def _mini_item(item: Dict[str, Any], limits: Dict[str, int]) -> Dict[str, Any]:
+    # item은 _compact_item 결과(리스트/딕셔너리 값도 이미 문자열로 바뀐 상태)
+    m = {k: item.get(k) for k in limits if item.get(k)}
+    if not m.get("movie") and item.get("title"):
+        m["movie"] = item["title"]
+    return {k: _clip_text(v, limits[k]) for k, v in m.items()}
+
+def _str_bytes(s: str, limit: int) -> int:
+    # _clip_text 결과의 UTF-8 길이("…"는 3바이트)
+    if len(s) > limit:
+        s = s[: max(0, limit - 1)]
+        extra = 3
+    else:
+        extra = 0
+    return (len(s) if s.isascii() else len(s.encode("utf-8"))) + extra
+
+def _estimate_items_bytes(items: List[Dict[str, Any]], limits: Dict[str, int]) -> int:
+    # 직렬화 없이 해당 프로필 적용 후 items 크기의 하한을 계산.
+    # 하한이라 실제로 들어가는 프로필을 건너뛰는 일은 없고, 빗나가면 다음 프로필로 내려갈 뿐
+    total = max(0, len(items) - 1)  # 항목 사이 ,
+    for it in items:
+        total += 1  # {} (필드 사이 , 는 필드마다 1씩 세고 마지막 하나를 뺀 몫)
+        for k, lim in limits.items():
+            v = it.get(k)
+            if not v:
+                continue
+            # "k": + 값(문자열이면 "" 포함, 아니면 최소 1바이트) + ,
+            n = _str_bytes(v, lim) + 2 if isinstance(v, str) else 1
+            total += len(k) + 4 + n
+    return total
+
+FULL_LIMITS = {k: FIELD_LIMITS.get(k, 160) for k in KEEP_KEYS}
+
+# (키별 글자 제한, _compact_item 결과를 줄이는 함수, 잡음 키 제거 여부) — 덜 줄이는 순서
+_PROFILES = [
+    (FULL_LIMITS, lambda it: it, False),
+    (MINI_LIMITS, lambda it: _mini_item(it, MINI_LIMITS), False),
+    (ULTRA_LIMITS, lambda it: _mini_item(it, ULTRA_LIMITS), True),
+]
+
+def _dumps(obj: Any) -> bytes:
+    # orjson은 compact UTF-8 bytes를 바로 내줌. 바이트 길이 >= 글자 수라서 제한 판정은 더 보수적
+    return orjson.dumps(obj)
+
+def _enforce(resp: Dict[str, Any]) -> Tuple[Dict[str, Any], bytes]:
+    # 크기 검사 때 만든 bytes를 같이 돌려줌 → 호출 측에서 다시 직렬화할 필요 없음
+    buf = _dumps(resp)
+    if len(buf) <= MAX_RESPONSE_CHARS:
+        # 대부분의 응답(핸들러에서 이미 _clip됨)은 여기서 끝 → 압축 패스 생략
+        return resp, buf
+
+    # 예산을 넘은 경우에만: 항목마다 _compact_item을 한 번 적용하고 모든 프로필이 그 결과를 줄임
+    raw = resp.get("items")
+    items = [
+        _compact_item(x if isinstance(x, dict) else {"movie": str(x)}) for x in raw
+    ] if isinstance(raw, list) else []
+
+    # 항목을 뺀 나머지(ok/output 등) 크기 + 항목별 길이로 각 프로필의 결과 크기를 추정하고,
+    # 예산에 들어가는 가장 덜 줄이는 프로필 하나를 골라 한 번에 적용
+    overhead = len(_dumps({**resp, "items": []}))
+    start = next(
+        (i for i, (limits, _, _) in enumerate(_PROFILES)
+         if overhead + _estimate_items_bytes(items, limits) <= MAX_RESPONSE_CHARS),
+        len(_PROFILES) - 1,
+    )
+
+    # 추정이 빗나간 경우에만 다음 프로필로 내려감
+    for _, shrink, drop_noisy in _PROFILES[start:]:
+        resp["items"] = [shrink(x) for x in items]
+        if drop_noisy:
+            for noisy in NOISY_KEYS:
+                resp.pop(noisy, None)
+        buf = _dumps(resp)
+        if len(buf) <= MAX_RESPONSE_CHARS:
+            return resp, buf
+
+    resp["items"] = [{"movie": _clip_text(it.get("movie", ""), 70)} for it in resp["items"]][:10]
+    resp["note"] = "Response compacted to fit Actions payload limits."
+    return resp, _dumps(resp)
 
 def enforce_response_budget(resp: Dict[str, Any]) -> Dict[str, Any]:
-    if "items" in resp and isinstance(resp["items"], list):
-        resp["items"] = [
-            _compact_item(x if isinstance(x, dict) else {"movie": str(x)})
-            for x in resp["items"]
-        ]
-
-    if _json_len(resp) <= MAX_RESPONSE_CHARS:
-        return resp
-
-    # 2차: 초미니 모드
-    mini_keys = ["movie", "year", "vibe_point", "reason"]
-    new_items: List[Dict[str, Any]] = []
-    for it in resp.get("items", []):
-        m = {k: it.get(k) for k in mini_keys if it.get(k)}
-        if not m.get("movie") and it.get("title"):
-            m["movie"] = it["title"]
-        for k in list(m.keys()):
-            lim = 120 if k in ("vibe_point", "reason") else 80
-            m[k] = _clip_text(m[k], lim)
-        new_items.append(m)
-    resp["items"] = new_items
-
-    if _json_len(resp) <= MAX_RESPONSE_CHARS:
-        return resp
-
-    # 3차: 더 강하게 줄이기 + 잡음 제거
-    for it in resp.get("items", []):
-        for k, v in list(it.items()):
-            it[k] = _clip_text(v, 60 if k != "movie" else 70)
-
-    for noisy in ["debug", "raw", "candidates", "forbidden_hits", "logs"]:
-        resp.pop(noisy, None)
-
-    if _json_len(resp) > MAX_RESPONSE_CHARS:
-        resp["items"] = [{"movie": _clip_text(it.get("movie", ""), 70)} for it in resp.get("items", [])][:10]
-        resp["note"] = "Response compacted to fit Actions payload limits."
-
-    return resp
+    return _enforce(resp)[0]
+
+def encode_response_budget(resp: Dict[str, Any]) -> bytes:
+    """enforce_response_budget와 같지만 최종 JSON bytes를 돌려줌(그대로 응답 본문으로 사용)."""
+    return _enforce(resp)[1]